@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+
+class Column():
+    ''' Integer coded column, codes index labels '''
+    def __init__(self, capacity):
+        self.codes = np.zeros(capacity, dtype=np.int32)
+        self.labels = []
+        self.index = {}
+
+    def encode(self, value):
+        value = str(value)
+        if value not in self.index:
+            self.index[value] = len(self.labels)
+            self.labels.append(value)
+        return self.index[value]
+
+    def grow(self, capacity):
+        self.codes = np.resize(self.codes, capacity)
+
+
+def count_by(key_codes, key_labels, state_codes, state_labels):
+    ''' Count rows by key and state codes, return {key: {state: count}} '''
+    n_states = len(state_labels)
+    counts = np.bincount(key_codes * n_states + state_codes, minlength=len(key_labels) * n_states)
+    counts = counts.reshape(len(key_labels), n_states)
+    result = {}
+    for k, s in zip(*np.nonzero(counts)):
+        result.setdefault(key_labels[k], {})[state_labels[s]] = int(counts[k, s])
+    return result
+
+
+class FleetAggregator():
+    ''' Instance fields kept as integer coded columns, summarized per cycle with bincount '''
+    def __init__(self, stuck_cycles=3, stuck_limit=100, capacity=1024):
+        self.stuck_cycles = stuck_cycles
+        self.stuck_limit = stuck_limit
+        self.capacity = capacity
+        self.rows = {}  # instance id -> row
+        self.ids = [None] * capacity
+        self.free = []
+        self.size = 0
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.columns = {name: Column(capacity) for name in ['vm_state', 'task_state', 'host', 'project_id']}
+        self.none_task = self.columns['task_state'].encode(None)
+        self.previous_task = np.full(capacity, -1, dtype=np.int32)
+        self.streaks = np.zeros(capacity, dtype=np.int32)
+        self.groups = Column(0)  # security group labels
+        self.group_counts = np.zeros(0, dtype=np.int64)
+        self.row_groups = {}  # row -> security group codes
+
+    def grow(self):
+        self.capacity *= 2
+        self.ids.extend([None] * (self.capacity - len(self.ids)))
+        self.alive = np.resize(self.alive, self.capacity)
+        self.alive[self.size:] = False
+        self.previous_task = np.resize(self.previous_task, self.capacity)
+        self.streaks = np.resize(self.streaks, self.capacity)
+        for c in self.columns.values():
+            c.grow(self.capacity)
+
+    def update(self, id, instance):
+        ''' Add or update instance record (dict of vm_state, task_state, host, project_id, security_groups) '''
+        row = self.rows.get(id)
+        if row == None:
+            if len(self.free) != 0:
+                row = self.free.pop()
+            else:
+                if self.size == self.capacity:
+                    self.grow()
+                row = self.size
+                self.size += 1
+            self.rows[id] = row
+            self.ids[row] = id
+            self.alive[row] = True
+            self.previous_task[row] = -1
+            self.streaks[row] = 0
+        for name, c in self.columns.items():
+            c.codes[row] = c.encode(instance.get(name))
+        self.set_groups(row, [self.groups.encode(g) for g in instance.get('security_groups') or []])
+
+    def remove(self, id):
+        row = self.rows.pop(id, None)
+        if row == None:
+            return
+        self.alive[row] = False
+        self.ids[row] = None
+        self.set_groups(row, [])
+        self.free.append(row)
+
+    def set_groups(self, row, codes):
+        new_groups = len(self.groups.labels) - len(self.group_counts)
+        if new_groups > 0:
+            self.group_counts = np.concatenate([self.group_counts, np.zeros(new_groups, dtype=np.int64)])
+        for code in self.row_groups.pop(row, []):
+            self.group_counts[code] -= 1
+        for code in codes:
+            self.group_counts[code] += 1
+        if len(codes) != 0:
+            self.row_groups[row] = codes
+
+    def summarize(self):
+        ''' Counts by vm_state/task_state per host and project, stuck task states and security group usage '''
+        n = self.size
+        alive = self.alive[:n]
+        vm, task = self.columns['vm_state'], self.columns['task_state']
+        host, project = self.columns['host'], self.columns['project_id']
+        vm_codes, task_codes = vm.codes[:n][alive], task.codes[:n][alive]
+
+        # vm_state and task_state pair as one state code
+        n_tasks = len(task.labels)
+        state_codes = vm_codes * n_tasks + task_codes
+        state_labels = [f'{v}/{t}' for v in vm.labels for t in task.labels]
+
+        # consecutive cycles each instance stays in same task state
+        same = task.codes[:n] == self.previous_task[:n]
+        self.streaks[:n] = np.where(task.codes[:n] == self.none_task, 0, np.where(same, self.streaks[:n] + 1, 1))
+        self.previous_task[:n] = task.codes[:n]
+        stuck = alive & (self.streaks[:n] >= self.stuck_cycles)
+        stuck_rows = np.nonzero(stuck)[0]
+        stuck_counts = np.bincount(task.codes[:n][stuck], minlength=n_tasks)
+
+        return {
+            'total': int(alive.sum()),
+            'by_state': count_by(np.zeros(len(state_codes), dtype=np.int32), ['all'], state_codes, state_labels).get('all', {}),
+            'by_host': count_by(host.codes[:n][alive], host.labels, state_codes, state_labels),
+            'by_project': count_by(project.codes[:n][alive], project.labels, state_codes, state_labels),
+            'stuck': {
+                'cycles': self.stuck_cycles,
+                'count': len(stuck_rows),
+                'by_task_state': {task.labels[c]: int(stuck_counts[c]) for c in np.nonzero(stuck_counts)[0]},
+                'instances': [self.ids[r] for r in stuck_rows[:self.stuck_limit]],
+            },
+            'security_groups': {self.groups.labels[c]: int(self.group_counts[c]) for c in np.nonzero(self.group_counts)[0]},
+        }
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+import sys
+import json
+import time
+import openstack
+from service import agent_fields
+from router import router_fields, port_fields, router_port_owners
+from projection import list_resources
+
+
+conn = openstack.connect()
+
+
+def measure(path, key, fields=None, repeat=5, **filters):
+    ''' Return average response bytes, request seconds and parse seconds of listing '''
+    params = dict(filters)
+    if fields != None:
+        params['fields'] = fields
+    size, request_time, parse_time = 0, 0, 0
+    for i in range(repeat):
+        start = time.perf_counter()
+        response = conn.network.get(path, params=params)
+        content = response.content
+        request_time += time.perf_counter() - start
+        start = time.perf_counter()
+        json.loads(content)[key]
+        parse_time += time.perf_counter() - start
+        size += len(content)
+    return size / repeat, request_time / repeat, parse_time / repeat
+
+
+def compare(name, path, key, fields, repeat=5, **filters):
+    full = measure(path, key, repeat=repeat, **filters)
+    projected = measure(path, key, fields=fields, repeat=repeat, **filters)
+    report(name, full, projected)
+
+
+def compare_router_ports(repeat=5, sample=10):
+    ''' Compare ports query of each router as sent by router.py, averaged over sample routers '''
+    routers = list_resources(conn.network, '/routers', 'routers', ['id'])[:sample]
+    if len(routers) == 0:
+        print('router ports: no routers')
+        return
+    full, projected = [0, 0, 0], [0, 0, 0]
+    for r in routers:
+        filters = {'device_id': r['id'], 'device_owner': router_port_owners}
+        for total, result in [(full, measure('/ports', 'ports', repeat=repeat, **filters)),
+                              (projected, measure('/ports', 'ports', fields=port_fields, repeat=repeat, **filters))]:
+            for i, v in enumerate(result):
+                total[i] += v / len(routers)
+    report(f'router ports (per router, {len(routers)} routers)', full, projected)
+
+
+def report(name, full, projected):
+    print(f'{name}:')
+    for label, f, p in zip(['bytes', 'request ms', 'parse ms'], full, projected):
+        if label != 'bytes':
+            f, p = f * 1000, p * 1000
+        saving = (1 - p / f) * 100 if f else 0
+        print(f'  {label:<10} full={f:.1f} projected={p:.1f} saving={saving:.1f}%')
+
+
+def main(repeat=5):
+    compare('agents', '/agents', 'agents', agent_fields, repeat)
+    compare('routers', '/routers', 'routers', router_fields, repeat)
+    compare_router_ports(repeat)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+import os
+import time
+import fcntl
+import pickle
+import hashlib
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+
+# seconds a listing is reused, shorter for resources checked for state
+resource_ttls = {
+    'compute_services': 60,
+    'projects': 300,
+}
+
+
+class ResponseCache():
+    ''' TTL and LRU cache of listings, concurrent loads of same key share one call '''
+    def __init__(self, maxsize=128, ttls={}, default_ttl=60, cache_dir=None):
+        self.maxsize = maxsize
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self.cache_dir = cache_dir
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.inflight = {}  # key -> loading call shared by waiting threads
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, loader, resource=None):
+        ttl = self.ttls.get(resource, self.default_ttl)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry != None and entry[0] > time.time():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            call = self.inflight.get(key)
+            leader = call == None
+            if leader:
+                call = {'done': threading.Event(), 'value': None, 'error': None}
+                self.inflight[key] = call
+            else:
+                self.coalesced += 1
+
+        if not leader:  # wait result of in-flight call
+            call['done'].wait()
+            if call['error'] != None:
+                raise call['error']
+            return call['value']
+
+        try:
+            if self.cache_dir != None:
+                expires_at, value, loaded = self.load_shared(key, loader, ttl)
+            else:
+                expires_at, value, loaded = time.time() + ttl, loader(), True
+            call['value'] = value
+            with self._lock:
+                if loaded:
+                    self.misses += 1
+                else:  # loaded by other process
+                    self.hits += 1
+                self.entries[key] = (expires_at, value)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+            return value
+        except Exception as e:
+            call['error'] = e
+            with self._lock:
+                self.misses += 1
+            raise
+        finally:
+            with self._lock:
+                del(self.inflight[key])
+            call['done'].set()
+
+    def load_shared(self, key, loader, ttl):
+        ''' Load from cache directory shared by collector processes, lock file makes one process call loader,
+            return expires time, value and whether loader was called '''
+        Path(self.cache_dir).mkdir(parents=True, exist_ok=True)
+        path = Path(self.cache_dir) / hashlib.sha1(key.encode()).hexdigest()
+        with open(f'{path}.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if path.exists() and path.stat().st_mtime + ttl > time.time():
+                with open(path, 'rb') as f:
+                    return path.stat().st_mtime + ttl, pickle.load(f), False
+            value = loader()
+            tmp_path = path.with_suffix('.tmp')
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            tmp_path.rename(path)
+            return time.time() + ttl, value, True
+
+    def stats(self):
+        return {'entries': len(self.entries), 'hits': self.hits,
+                'misses': self.misses, 'coalesced': self.coalesced}
+
+
+cache = ResponseCache(ttls=resource_ttls, cache_dir=os.environ.get('MONITOR_CACHE_DIR'))
+
+
+def compute_services(conn):
+    def load():
+        return [{'id': s.id, 'binary': s.binary, 'state': s.state, 'host': s.host}
+                for s in conn.compute.services()]
+    return cache.get(f'{conn._compute_region}.compute_services', load, 'compute_services')
+
+
+def projects(conn):
+    def load():
+        return [{'id': p.id, 'name': p.name, 'is_enabled': p.is_enabled}
+                for p in conn.identity.projects()]
+    return cache.get(f'{conn._compute_region}.projects', load, 'projects')
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import pickle
+import threading
+import logging as log
+from pathlib import Path
+from datetime import datetime
+
+
+# checkpoints kept with their journals, a week of hourly checkpoints
+checkpoint_keep = int(os.environ.get('MONITOR_CHECKPOINT_KEEP', 168))
+
+
+def to_epoch(check_time):
+    return int(datetime.strptime(check_time, "%Y-%m-%d %H:%M:%S").timestamp())
+
+
+class StateJournal():
+    ''' Keep entity state of collector with periodic binary checkpoints and journal of changes '''
+    def __init__(self, collector, log_dir='./log', interval=3600, keep=checkpoint_keep):
+        self.collector = collector
+        self.checkpoint_dir = Path(log_dir) / 'checkpoints'
+        self.interval = interval
+        self.keep = max(keep, 1)
+        self.checkpoint_at = None
+        self._journal = None
+        self._lock = threading.Lock()
+        # continue from latest state of previous run
+        self.state = reconstruct(collector, int(time.time()), log_dir) or {}
+
+    def write_checkpoint(self, epoch):
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        path = self.checkpoint_dir / f'{self.collector}.{epoch}.ckpt'
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self.state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path.rename(path)
+        if self._journal != None:
+            self._journal.close()
+        self._journal = open(self.checkpoint_dir / f'{self.collector}.{epoch}.journal', 'ab')
+        self.checkpoint_at = epoch
+        log.debug(f'{self.collector} checkpoint written at {epoch}')
+        self.remove_old_checkpoints()
+
+    def remove_old_checkpoints(self):
+        ''' Remove checkpoints and journals beyond keep latest ones '''
+        epochs = list_checkpoints(self.collector, self.checkpoint_dir)
+        for epoch in epochs[:-self.keep]:
+            for suffix in ['ckpt', 'journal']:
+                (self.checkpoint_dir / f'{self.collector}.{epoch}.{suffix}').unlink(missing_ok=True)
+            log.debug(f'{self.collector} checkpoint at {epoch} removed')
+
+    def record(self, entity, key, value, check_time):
+        ''' Apply change to state, key None replaces all entities, value None removes entity '''
+        epoch = to_epoch(check_time)
+        with self._lock:
+            if self.checkpoint_at == None or epoch - self.checkpoint_at >= self.interval:
+                self.write_checkpoint(epoch)
+            apply(self.state, entity, key, value)
+            pickle.dump((epoch, entity, key, value), self._journal, protocol=pickle.HIGHEST_PROTOCOL)
+            self._journal.flush()
+
+    def record_all(self, entity, records, check_time, key='id'):
+        self.record(entity, None, {r[key]: r for r in records}, check_time)
+
+
+def apply(state, entity, key, value):
+    if key == None:
+        state[entity] = dict(value)
+    elif value == None:
+        state.get(entity, {}).pop(key, None)
+    else:
+        state.setdefault(entity, {})[key] = value
+
+
+def list_checkpoints(collector, checkpoint_dir):
+    ''' Return sorted checkpoint epochs of collector '''
+    epochs = []
+    for path in Path(checkpoint_dir).glob(f'{collector}.*.ckpt'):
+        epochs.append(int(path.name.split('.')[-2]))
+    return sorted(epochs)
+
+
+def reconstruct(collector, epoch, log_dir='./log'):
+    ''' Rebuild state at epoch from nearest earlier checkpoint and its journal, None if no checkpoint '''
+    checkpoint_dir = Path(log_dir) / 'checkpoints'
+    epochs = [e for e in list_checkpoints(collector, checkpoint_dir) if e <= epoch]
+    if len(epochs) == 0:
+        return None
+    checkpoint = epochs[-1]
+    with open(checkpoint_dir / f'{collector}.{checkpoint}.ckpt', 'rb') as f:
+        state = pickle.load(f)
+    journal = checkpoint_dir / f'{collector}.{checkpoint}.journal'
+    if not journal.exists():
+        return state
+    with open(journal, 'rb') as f:
+        while True:
+            try:
+                t, entity, key, value = pickle.load(f)
+            except (EOFError, pickle.UnpicklingError):  # end of journal or partial write
+                break
+            if t > epoch:
+                continue
+            apply(state, entity, key, value)
+    return state
+
+
+if __name__ == '__main__':
+    # print state of collector at given time
+    if len(sys.argv) < 3:
+        print(f'Arguments: <collector> <"YYYY-mm-dd HH:MM:SS"> [log dir]')
+        sys.exit(1)
+    log_dir = sys.argv[3] if len(sys.argv) > 3 else './log'
+    state = reconstruct(sys.argv[1], to_epoch(sys.argv[2]), log_dir)
+    if state == None:
+        print(f'no checkpoint of {sys.argv[1]} before {sys.argv[2]}')
+        sys.exit(1)
+    print(json.dumps(state, indent=2, default=str))
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import queue
+import socket
+import threading
+import logging as log
+from datetime import datetime
+
+
+class Subscriber(threading.Thread):
+    ''' Sender thread of one subscriber connection with bounded buffer '''
+    def __init__(self, sock, buffer_size=1000, timeout=30):
+        super().__init__(daemon=True)
+        self.sock = sock
+        self.sock.settimeout(timeout)
+        self.topics = set()
+        self.buffer = queue.Queue(maxsize=buffer_size)
+        self.dropped = 0
+        self.ready = False
+        self.closed = False
+
+    def accepts(self, topic):
+        return self.ready and (len(self.topics) == 0 or topic in self.topics)
+
+    def offer(self, line):
+        # never block publisher, drop event if subscriber is too slow
+        try:
+            self.buffer.put_nowait(line)
+        except queue.Full:
+            if self.dropped == 0:
+                log.warning(f'event subscriber buffer full, dropping events')
+            self.dropped += 1
+
+    def run(self):
+        try:
+            # first line sent by subscriber is topic filter, empty for all topics
+            topics = self.sock.makefile('r').readline()
+            self.topics = set(topics.split())
+            self.ready = True
+            log.info(f'event subscriber connected, topics={self.topics or "all"}')
+            while not self.closed:
+                line = self.buffer.get()
+                if line == None:
+                    break
+                self.sock.sendall(line)
+        except OSError as e:
+            log.info(f'event subscriber disconnected: {e}')
+        finally:
+            self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.dropped != 0:
+            log.warning(f'event subscriber dropped {self.dropped} events')
+        try:
+            self.buffer.put_nowait(None)
+        except queue.Full:
+            pass
+        self.sock.close()
+
+
+class EventBus(threading.Thread):
+    ''' Publish change events on local unix socket '''
+    def __init__(self, path=None, buffer_size=1000):
+        super().__init__(daemon=True)
+        self.path = path
+        self.buffer_size = buffer_size
+        self.subscribers = []
+        self.snapshots = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def start(self):
+        if self.path == None:  # no socket configured, publish is no-op
+            return
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        self._server.listen()
+        log.info(f'event bus listen on {self.path}')
+        super().start()
+
+    def run(self):
+        while True:
+            try:
+                sock, _ = self._server.accept()
+            except OSError:
+                break
+            s = Subscriber(sock, buffer_size=self.buffer_size)
+            with self._lock:
+                self.subscribers = [i for i in self.subscribers if not i.closed]
+                self.subscribers.append(s)
+            s.start()
+
+    def stop(self):
+        if self._server == None:
+            return
+        self._server.close()
+        with self._lock:
+            for s in self.subscribers:
+                s.close()
+            self.subscribers = []
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def publish(self, topic, id, old=None, new=None, timestamp=None):
+        subscribers = [s for s in self.subscribers if s.accepts(topic)]
+        if len(subscribers) == 0:
+            return
+        if timestamp == None:
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        event = {'topic': topic, 'id': id, 'old': old, 'new': new, 'timestamp': timestamp}
+        line = f'{json.dumps(event, default=str)}\n'.encode()
+        for s in subscribers:
+            s.offer(line)
+
+    def publish_changes(self, topic, records, fields=None, key='id', timestamp=None):
+        ''' Compare records with previous snapshot of topic and publish changed ones '''
+        current = {r[key]: r for r in records}
+        with self._lock:
+            previous = self.snapshots.get(topic)
+            self.snapshots[topic] = current
+        if previous == None:  # first snapshot, nothing to compare
+            return
+        for id, new in current.items():
+            old = previous.get(id)
+            if old == None:
+                self.publish(topic, id, None, new, timestamp)
+                continue
+            keys = fields if fields != None else new.keys()
+            if any(old.get(k) != new.get(k) for k in keys):
+                self.publish(topic, id, old, new, timestamp)
+        for id, old in previous.items():
+            if id not in current:
+                self.publish(topic, id, old, None, timestamp)
+
+
+def subscribe(path, topics=[], on_connect=None):
+    ''' Connect to event bus and yield events of given topics, on_connect called once subscribed '''
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+    sock.sendall(f"{' '.join(topics)}\n".encode())
+    if on_connect != None:
+        on_connect()
+    with sock.makefile('r') as f:
+        for line in f:
+            yield json.loads(line)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(f'Arguments: <socket path> [topic ...]')
+        sys.exit(1)
+    for event in subscribe(sys.argv[1], sys.argv[2:]):
+        print(json.dumps(event))
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import signal
+import resource
+import threading
+import tracemalloc
+import logging as log
+
+
+structures = {}  # name -> registered structure
+
+
+def register(name, obj):
+    ''' Register structure reported by memory report '''
+    structures[name] = obj
+
+
+def deep_size(obj, seen=None):
+    ''' Approximate size in bytes of obj and objects it contains '''
+    if seen == None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            size += deep_size(k, seen) + deep_size(v, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for i in obj:
+            size += deep_size(i, seen)
+    elif hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def rss():
+    ''' Current resident set size in bytes '''
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:  # no procfs, use peak rss
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def copy_structure(obj, retries=3):
+    ''' Copy structure changed by other threads, retry when it changes during copy '''
+    for i in range(retries):
+        try:
+            return list(obj) if isinstance(obj, (list, tuple, set, frozenset)) else dict(obj)
+        except RuntimeError:  # changed size during iteration
+            continue
+    return None
+
+
+def report(top=10):
+    ''' Log rss, registered structures and top allocators if tracemalloc is tracing '''
+    try:
+        log.info(f'memory rss={rss() / 1048576:.1f}MB')
+        for name, obj in list(structures.items()):
+            copy = copy_structure(obj)
+            if copy == None:
+                log.warning(f'memory structure {name} changing, skipped')
+                continue
+            log.info(f'memory structure {name} entries={len(copy)} size={deep_size(copy) / 1024:.1f}KB')
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            for stat in snapshot.statistics('lineno')[:top]:
+                log.info(f'memory top allocator {stat}')
+    except Exception as e:
+        log.error(f'memory report failed: {e}')
+
+
+def install(signum=signal.SIGUSR1):
+    ''' Log memory report on signal, start tracemalloc if MONITOR_TRACEMALLOC frames is set '''
+    frames = int(os.environ.get('MONITOR_TRACEMALLOC', 0))
+    if frames > 0:
+        tracemalloc.start(frames)
+
+    # report in own thread, handler runs between bytecodes of main thread
+    def handler(signum, frame):
+        try:
+            threading.Thread(target=report, daemon=True).start()
+        except Exception:
+            pass
+    signal.signal(signum, handler)
+
+
+class MemoryBudget():
+    ''' Evict entries of dict absent for cycles, or least recently seen beyond max entries '''
+    def __init__(self, name, entries, absent_cycles=1, max_entries=None, max_rss=None, on_evict=None):
+        self.name = name
+        self.entries = entries
+        self.absent_cycles = absent_cycles
+        self.max_entries = max_entries
+        self.max_rss = max_rss
+        self.on_evict = on_evict
+        self.cycle = 0
+        self.last_seen = {}
+        register(name, entries)
+
+    def seen(self, key):
+        self.last_seen[key] = self.cycle
+
+    def evict(self, key):
+        value = self.entries.pop(key, None)
+        self.last_seen.pop(key, None)
+        if self.on_evict != None:
+            self.on_evict(key, value)
+
+    def end_cycle(self):
+        ''' Evict entries after each check cycle '''
+        absent_cycles = self.absent_cycles
+        current_rss = rss()
+        if self.max_rss != None and current_rss > self.max_rss:
+            log.warning(f'memory rss {current_rss} over limit {self.max_rss}, evict {self.name} entries absent this cycle')
+            absent_cycles = 1
+        for key in list(self.entries.keys()):
+            last_seen = self.last_seen.setdefault(key, self.cycle)
+            if self.cycle - last_seen >= absent_cycles:
+                log.info(f'{self.name} {key} absent for {self.cycle - last_seen} cycles, evicted')
+                self.evict(key)
+        if self.max_entries != None and len(self.entries) > self.max_entries:
+            log.warning(f'{self.name} entries {len(self.entries)} over limit {self.max_entries}, evict least recently seen')
+            keys = sorted(self.entries.keys(), key=lambda k: self.last_seen[k])
+            for key in keys[:len(self.entries) - self.max_entries]:
+                self.evict(key)
+        self.cycle += 1
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+import sys
+import json
+import time
+import socket
+import threading
+import logging as log
+from kombu import Connection, Exchange, Queue, Producer
+
+
+# (control exchange, notification topic) of openstack services
+nova_notifications = ('nova', 'versioned_notifications.info')
+neutron_notifications = ('neutron', 'notifications.info')
+
+
+def parse_message(body):
+    ''' Return event_type, payload and timestamp of oslo.messaging notification '''
+    if isinstance(body, (str, bytes)):
+        body = json.loads(body)
+    if 'oslo.message' in body:  # oslo messaging envelope
+        body = json.loads(body['oslo.message'])
+    return body['event_type'], body['payload'], body.get('timestamp')
+
+
+def transport_url(url):
+    ''' Convert oslo.messaging transport url to kombu url '''
+    scheme, _, rest = url.partition('://')
+    if scheme == 'rabbit':
+        scheme = 'amqp'
+    hosts, _, vhost = rest.partition('/')
+    return ';'.join(f'{scheme}://{h}/{vhost}' for h in hosts.split(','))
+
+
+class NotificationListener(threading.Thread):
+    ''' Consume openstack notifications from message bus and pass to handler '''
+    def __init__(self, url, handler, targets=[nova_notifications, neutron_notifications],
+                 queue_name='openstack-monitor', retry_wait=10):
+        super().__init__(daemon=True)
+        self.url = transport_url(url)
+        self.handler = handler
+        self.targets = targets
+        self.queue_name = queue_name
+        self.retry_wait = retry_wait
+        self._stop_event = threading.Event()
+
+    def queues(self):
+        queues = []
+        for exchange, topic in self.targets:
+            queues.append(Queue(f'{self.queue_name}.{exchange}.{topic}',
+                                Exchange(exchange, type='topic', durable=False),
+                                routing_key=topic, durable=False, auto_delete=True))
+        return queues
+
+    def on_message(self, body, message):
+        try:
+            event_type, payload, timestamp = parse_message(body)
+            log.debug(f'notification {event_type}: {payload}')
+            self.handler(event_type, payload, timestamp)
+        except Exception as e:
+            log.error(f'fail to handle notification: {e}')
+        message.ack()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                with Connection(self.url) as c:
+                    with c.Consumer(self.queues(), callbacks=[self.on_message], accept=['json']):
+                        log.info(f'listening notifications {self.targets}')
+                        while not self._stop_event.is_set():
+                            try:
+                                c.drain_events(timeout=1)
+                            except socket.timeout:
+                                pass
+            except Exception as e:
+                log.error(f'notification listener failed: {e}')
+                self._stop_event.wait(self.retry_wait)
+
+    def stop(self):
+        self._stop_event.set()
+        super().join(0)
+
+
+def publish_notification(connection, target, event_type, payload):
+    ''' Publish notification in oslo messaging envelope, for testing listener '''
+    exchange, topic = target
+    message = {'event_type': event_type, 'payload': payload, 'priority': 'INFO',
+               'timestamp': time.strftime("%Y-%m-%d %H:%M:%S")}
+    body = {'oslo.version': '2.0', 'oslo.message': json.dumps(message)}
+    producer = Producer(connection, exchange=Exchange(exchange, type='topic', durable=False))
+    producer.publish(body, routing_key=topic, serializer='json')
+
+
+if __name__ == '__main__':
+    # print notifications of message bus
+    if len(sys.argv) != 2:
+        print(f'Arguments: <transport url>')
+        sys.exit(1)
+    log.basicConfig(format="%(asctime)s: %(message)s", level=log.INFO, datefmt="%Y-%m-%d %H:%M:%S")
+    listener = NotificationListener(sys.argv[1], lambda t, p, ts: print(f'{ts} {t} {json.dumps(p)}'))
+    listener.start()
+    listener.join()
@@ -9,6 +9,8 @@ import logging as log
 import openstack
 from pathlib import Path
 from datetime import datetime
+from snapshot import SnapshotStore
+import cache
 
 
 log.basicConfig(format="%(asctime)s: %(message)s", level=log.INFO, datefmt="%Y-%m-%d %H:%M:%S")
@@ -48,10 +50,10 @@ class Worker(threading.Thread):
 
 def check_projects():
     data = []
-    projects = conn.identity.projects()
+    projects = cache.projects(conn)
     for p in projects:
-        log.debug(f'{p.id} {p.name} {p.is_enabled}')
-        data.append({'id': p.id, 'name': p.name, 'enabled': p.is_enabled})
+        log.debug(f"{p['id']} {p['name']} {p['is_enabled']}")
+        data.append({'id': p['id'], 'name': p['name'], 'enabled': p['is_enabled']})
     return {'projects': data}
 
 def check_users():
@@ -87,6 +89,8 @@ def main(interval=3600, log_dir='./log'):
     roles_log_file = 'projects.roles.log'
     role_assignments_log_file = 'projects.role-assignments.log'
 
+    # identity data rarely changes, unchanged snapshot is written as reference line
+    snapshots = SnapshotStore(log_dir)
     data_queue = queue.Queue()
     projects_t = Worker(check_projects, queue=data_queue, interval=interval)
     users_t = Worker(check_users, queue=data_queue, interval=interval)
@@ -127,13 +131,7 @@ def main(interval=3600, log_dir='./log'):
 
         Path(log_dir).mkdir(parents=True, exist_ok=True)
         target_log_file = f'{log_dir}/{region}.{target_log_file}'
-        with open(target_log_file, 'a') as f:
-            for item in target_data:
-                l_data = []
-                for key, value in item.items():
-                    l_data.append(f"{key}={value}")
-                s_data = f','.join(l_data)
-                f.write(f'{check_time} {s_data}\n')
+        snapshots.write(target_log_file, check_time, target_data)
 
     projects_t.stop()
     users_t.stop()
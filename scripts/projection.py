@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+
+
+def list_resources(adapter, path, key, fields, **filters):
+    ''' List resources with server side fields projection, return list of dict of all pages '''
+    params = dict(filters)
+    params['fields'] = fields
+    response = adapter.get(path, params=params)
+    resources = []
+    while True:
+        body = response.json()
+        resources.extend(body[key])
+        # next page link given when neutron pagination_max_limit is set, keeps fields and filters
+        links = [l['href'] for l in body.get(f'{key}_links', []) if l.get('rel') == 'next']
+        if len(links) == 0 or len(body[key]) == 0:
+            return resources
+        response = adapter.get(links[0])
+
+
+def get_resource(adapter, path, key, fields):
+    ''' Get resource with server side fields projection, return None if not found '''
+    response = adapter.get(path, params={'fields': fields}, raise_exc=False)
+    if response.status_code == 404:
+        return None
+    if response.status_code >= 400:
+        raise Exception(f'get {path} failed, status={response.status_code}')
+    return response.json()[key]
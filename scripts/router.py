@@ -1,13 +1,29 @@
 #!/usr/bin/env python3
 
+import os
 import time
+import queue
 import openstack
 import logging as log
 from datetime import datetime
+from event import EventBus
+from notification import NotificationListener, neutron_notifications
+from projection import list_resources, get_resource
+from checkpoint import StateJournal
+import memory
+from memory import MemoryBudget
 
 log.basicConfig(format="%(asctime)s: %(message)s", level=log.INFO, datefmt="%Y-%m-%d %H:%M:%S")
 conn = openstack.connect()
 
+# neutron fields requested for router info
+router_fields = ['id', 'name', 'status', 'routes', 'project_id', 'external_gateway_info',
+                 'created_at', 'updated_at']
+port_fields = ['id', 'name', 'status', 'network_id', 'mac_address', 'fixed_ips', 'device_owner']
+# router owned ports, other ports may carry router id as device id
+router_port_owners = ['network:router_interface', 'network:router_interface_distributed',
+                      'network:ha_router_replicated_interface', 'network:router_gateway']
+
 
 def compare_dict_change(old, new):
     diff = {}
@@ -18,65 +34,141 @@ def compare_dict_change(old, new):
     return diff
 
 
-def main(interval=3600, log_dir='./log'):
+def get_router_info(r):
+    log.debug((f"{r['created_at']} {r['updated_at']} {r['id']} {r['name']} {r['status']} "
+               f"{r['routes']} {r['project_id']} {r['external_gateway_info']}"))
+
+    routes = []
+    for route in r['routes']:
+        destination = route['destination']
+        nexthop = route['nexthop']
+        routes.append(f'{destination}->{nexthop}')
+    routes.sort()
+
+    if r['external_gateway_info'] != None:
+        external_gateway_info = {
+            'network': r['external_gateway_info']['network_id'],
+            'snat': r['external_gateway_info']['enable_snat'],
+            'ips': r['external_gateway_info']['external_fixed_ips']
+        }
+    else:
+        external_gateway_info = None
+
+    r_interfaces = list_resources(conn.network, '/ports', 'ports', port_fields,
+                                  device_id=r['id'], device_owner=router_port_owners)
+    router_interfaces = sorted(r_interfaces, key = lambda i: i['id'])
+
+    return {
+        'created_at': r['created_at'],
+        'updated_at': r['updated_at'],
+        'status': r['status'],
+        'project_id': r['project_id'],
+        'routes': routes,
+        'external_gateway_info': external_gateway_info,
+        'interfaces': router_interfaces
+    }
+
+
+def update_router(monitoring_routers, r, events, journal, check_time):
+    router_id = r['id']
+    r_info = get_router_info(r)
+
+    # compare diff
+    if router_id not in monitoring_routers:
+        log.info(f'monitoring router {router_id}: {r_info}')
+        events.publish('routers', router_id, None, r_info, check_time)
+        journal.record('routers', router_id, r_info, check_time)
+        diff = {}
+    else:
+        diff = compare_dict_change(monitoring_routers[router_id], r_info)
+
+    if diff != {}:
+        log.info(f'router {router_id} info changed: {diff}')
+        events.publish('routers', router_id, monitoring_routers[router_id], r_info, check_time)
+        journal.record('routers', router_id, r_info, check_time)
+
+    monitoring_routers[router_id] = r_info
+
+
+def handle_notification(router_queue, event_type, payload, timestamp):
+    ''' Queue id of router changed by neutron notification '''
+    if event_type.startswith('router.interface.'):
+        router_id = payload['router_interface']['id']
+    elif event_type.startswith('router.'):
+        router_id = payload['router']['id'] if 'router' in payload else payload.get('router_id')
+    elif event_type.startswith('port.') and 'port' in payload:
+        if payload['port'].get('device_owner') not in router_port_owners:
+            return
+        router_id = payload['port']['device_id']
+    else:
+        return
+    if router_id:
+        router_queue.put(router_id)
 
-    monitoring_routers = {}
-    
+
+def main(interval=3600, log_dir='./log', event_dir=None, transport_url=None, evict_cycles=3, max_rss=None):
+
+    events = EventBus(f'{event_dir}/router.sock' if event_dir else None)
+    events.start()
+    region = conn._compute_region
+    journal = StateJournal(f'{region}.router', log_dir)
+    # continue from journaled state, routers deleted while stopped are evicted as absent
+    monitoring_routers = dict(journal.state.get('routers', {}))
+
+    # evict routers absent from listing for evict cycles
+    def evict_router(router_id, r_info):
+        check_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        events.publish('routers', router_id, r_info, None, check_time)
+        journal.record('routers', router_id, None, check_time)
+
+    memory.install()
+    budget = MemoryBudget('monitoring_routers', monitoring_routers, absent_cycles=evict_cycles,
+                          max_rss=max_rss, on_evict=evict_router)
+
+    # routers changed by notifications are checked at once, polling only reconcile
+    router_queue = queue.Queue()
+    if transport_url:
+        listener = NotificationListener(transport_url,
+                                        lambda t, p, ts: handle_notification(router_queue, t, p, ts),
+                                        targets=[neutron_notifications],
+                                        queue_name='openstack-monitor.router')
+        listener.start()
+
+    next_check = 0
     while True:
+        if time.time() >= next_check:
+            now = datetime.now()
+            check_time = now.strftime("%Y-%m-%d %H:%M:%S")
+
+            routers = list_resources(conn.network, '/routers', 'routers', router_fields)
+            for r in routers:
+                update_router(monitoring_routers, r, events, journal, check_time)
+                budget.seen(r['id'])
+            budget.end_cycle()
+
+            next_check = time.time() + interval
+            continue
+
+        try:
+            router_id = router_queue.get(timeout=max(next_check - time.time(), 0))
+        except queue.Empty:
+            continue
         now = datetime.now()
         check_time = now.strftime("%Y-%m-%d %H:%M:%S")
-
-        routers = conn.list_routers()
-        for r in routers:
-            log.debug(f'{r.created_at} {r.updated_at} {r.id} {r.name} {r.status} {r.routes} {r.project_id} {r.external_gateway_info}')
-            
-            routes = []
-            for route in r.routes:
-                destination = route['destination']
-                nexthop = route['nexthop']
-                routes.append(f'{destination}->{nexthop}')
-            routes.sort()
-
-            if r.external_gateway_info != None:
-                external_gateway_info = {
-                    'network': r.external_gateway_info['network_id'],
-                    'snat': r.external_gateway_info['enable_snat'],
-                    'ips': r.external_gateway_info['external_fixed_ips']
-                }
-            else:
-                external_gateway_info = None
-           
-            router_interfaces = []
-            r_interfaces = conn.list_router_interfaces(r)
-            for ri in r_interfaces:
-                router_interfaces.append(dict(ri))
-            router_interfaces = sorted(router_interfaces, key = lambda i: i['id'])
-                
-            r_info = {
-                'created_at': r.created_at,
-                'updated_at': r.updated_at,
-                'status': r.status,
-                'project_id': r.project_id,
-                'routes': routes,
-                'external_gateway_info': external_gateway_info,
-                'interfaces': router_interfaces
-            }
-
-            # compare diff
-            if r.id not in monitoring_routers:
-                log.info(f'monitoring router {r.id}: {r_info}')
-                diff = {}
-            else:
-                diff = compare_dict_change(monitoring_routers[r.id], r_info)
-            
-            monitoring_routers[r.id] = r_info
-           
-            if diff != {}:
-                log.info(f'router {r.id} info changed: {diff}')
-            
-        time.sleep(interval)
+        try:
+            r = get_resource(conn.network, f'/routers/{router_id}', 'router', router_fields)
+            if r != None:
+                update_router(monitoring_routers, r, events, journal, check_time)
+            elif router_id in monitoring_routers:
+                log.info(f'router {router_id} deleted')
+                budget.evict(router_id)
+        except Exception as e:  # reconciled by next polling
+            log.error(f'fail to refresh router {router_id}: {e}')
 
 
 if __name__ == '__main__':
-    main()
-
+    max_rss = os.environ.get('MONITOR_MAX_RSS_MB')
+    main(event_dir=os.environ.get('MONITOR_EVENT_DIR'),
+         transport_url=os.environ.get('MONITOR_TRANSPORT_URL'),
+         evict_cycles=int(os.environ.get('MONITOR_EVICT_CYCLES', 3)),
+         max_rss=int(max_rss) * 1048576 if max_rss else None)
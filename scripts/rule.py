@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+
+import sys
+import json
+import operator
+import logging as log
+from collections import deque
+from datetime import datetime
+
+
+operators = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda a, b: a in b,
+    'not in': lambda a, b: a not in b,
+}
+
+
+def parse_time(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value).replace('T', ' ').rstrip('Z'))
+
+
+def compile_clause(clause):
+    ''' Compile one condition clause into predicate(item, now) '''
+    field = clause['field']
+    value = clause['value']
+    op = operators.get(clause.get('op', '=='))
+    if op == None:
+        raise ValueError(f"unknown operator {clause['op']} of field {field}")
+
+    if 'ratio_of' in clause:  # compare field / ratio_of field
+        total = clause['ratio_of']
+        def predicate(item, now):
+            if not item[total]:
+                return False
+            return op(item[field] / item[total], value)
+        return predicate, {field, total}
+
+    if clause.get('age', False):  # compare seconds elapsed since time field (UTC)
+        def predicate(item, now):
+            if item[field] == None:
+                return op(float('inf'), value)
+            return op((now - parse_time(item[field])).total_seconds(), value)
+        return predicate, {field}
+
+    def predicate(item, now):
+        return op(item[field], value)
+    return predicate, {field}
+
+
+class Rule():
+    def __init__(self, name, entity, when, cycles=1, key='id', flap_transitions=4, flap_cycles=10):
+        self.name = name
+        self.entity = entity
+        self.cycles = cycles
+        self.key = key
+        self.flap_transitions = flap_transitions
+        self.flap_cycles = flap_cycles
+        self.fields = {key}
+        self.predicates = []
+        for clause in when:
+            predicate, fields = compile_clause(clause)
+            self.predicates.append(predicate)
+            self.fields |= fields
+        self.states = {}
+
+    def match(self, item, now):
+        for predicate in self.predicates:
+            if not predicate(item, now):
+                return False
+        return True
+
+
+class RuleEngine():
+    ''' Evaluate compiled alert rules against collected snapshots '''
+    def __init__(self, rules=[]):
+        self.rules = []
+        self.index = {}  # entity -> field -> rules
+        self.candidates = {}  # (entity, snapshot fields) -> rules
+        self.cycle = {}
+        for r in rules:
+            self.add(r)
+
+    def add(self, rule):
+        self.rules.append(rule)
+        fields = self.index.setdefault(rule.entity, {})
+        for f in rule.fields:
+            fields.setdefault(f, []).append(rule)
+        self.candidates = {}
+
+    def relevant_rules(self, entity, keys):
+        ''' Rules of entity which fields all exist in snapshot '''
+        keys = frozenset(keys)
+        if (entity, keys) not in self.candidates:
+            rules = set()
+            for f, f_rules in self.index.get(entity, {}).items():
+                if f in keys:
+                    rules.update(r for r in f_rules if r.fields <= keys)
+            self.candidates[(entity, keys)] = [r for r in self.rules if r in rules]
+        return self.candidates[(entity, keys)]
+
+    def evaluate(self, entity, records, timestamp=None):
+        ''' Evaluate snapshot of entity, return alerts fired or resolved in this cycle '''
+        if entity not in self.index or len(records) == 0:
+            return []
+        if timestamp == None:
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        cycle = self.cycle.get(entity, 0) + 1
+        self.cycle[entity] = cycle
+        now = datetime.utcnow()
+        alerts = []
+        for rule in self.relevant_rules(entity, records[0].keys()):
+            seen = set()
+            for item in records:
+                id = item[rule.key]
+                seen.add(id)
+                try:
+                    matched = rule.match(item, now)
+                except Exception as e:
+                    log.error(f'rule {rule.name} evaluate {entity} {id} failed: {e}')
+                    continue
+                alert = self.update_state(rule, id, matched, cycle)
+                if alert != None:
+                    alert.update({'entity': entity, 'id': id, 'checked_at': timestamp, 'record': item})
+                    alerts.append(alert)
+            for id in list(rule.states.keys()):  # forget entities no longer exist
+                if id not in seen:
+                    del(rule.states[id])
+        return alerts
+
+    def update_state(self, rule, id, matched, cycle):
+        state = rule.states.get(id)
+        if state == None:
+            state = {'matched': False, 'streak': 0, 'active': False,
+                     'flapping': False, 'transitions': deque()}
+            rule.states[id] = state
+
+        if matched != state['matched']:
+            state['matched'] = matched
+            state['transitions'].append(cycle)
+        transitions = state['transitions']
+        while len(transitions) != 0 and transitions[0] <= cycle - rule.flap_cycles:
+            transitions.popleft()
+        state['streak'] = state['streak'] + 1 if matched else 0
+
+        # suppress notification while state changes too often
+        flapping = len(transitions) >= rule.flap_transitions
+        if flapping != state['flapping']:
+            state['flapping'] = flapping
+            log.warning(f"rule {rule.name} {id} flapping {'started' if flapping else 'stopped'}")
+        if flapping:
+            return None
+
+        if matched and state['streak'] >= rule.cycles and not state['active']:
+            state['active'] = True
+            return {'rule': rule.name, 'status': 'firing'}
+        if not matched and state['active']:
+            state['active'] = False
+            return {'rule': rule.name, 'status': 'resolved'}
+        return None
+
+
+def load_rules(path):
+    ''' Load rules from json config file '''
+    with open(path) as f:
+        config = json.load(f)
+    rules = []
+    for c in config['rules']:
+        try:
+            rules.append(Rule(c['name'], c['entity'], c['when'],
+                              cycles=c.get('for', 1),
+                              key=c.get('key', 'id'),
+                              flap_transitions=c.get('flap_transitions', 4),
+                              flap_cycles=c.get('flap_cycles', 10)))
+        except KeyError as e:
+            raise ValueError(f'rule {c} missing key {e}')
+    log.info(f'loaded {len(rules)} rules from {path}')
+    return RuleEngine(rules)
+
+
+if __name__ == '__main__':
+    # validate rules config file
+    if len(sys.argv) != 2:
+        print(f'Arguments: <rules file>')
+        sys.exit(1)
+    engine = load_rules(sys.argv[1])
+    for r in engine.rules:
+        print(f'{r.entity} {r.name} for={r.cycles} fields={sorted(r.fields)}')
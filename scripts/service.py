@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+import os
 import time
 import openstack
 import pymysql
@@ -8,11 +9,22 @@ import threading
 import logging as log
 from pathlib import Path
 from datetime import datetime
+from event import EventBus
+from rule import RuleEngine, load_rules
+from projection import list_resources
+from snapshot import SnapshotStore
+from checkpoint import StateJournal
+import cache
+import memory
 
 
 log.basicConfig(format="%(asctime)s: %(message)s", level=log.INFO, datefmt="%Y-%m-%d %H:%M:%S")
 conn = openstack.connect()
 
+# neutron agent fields requested by check_network_agents
+agent_fields = ['id', 'binary', 'admin_state_up', 'alive', 'host',
+                'heartbeat_timestamp', 'started_at', 'created_at']
+
 
 def check_core_services(return_queue, retry=3):
     for i in range(retry):
@@ -60,10 +72,10 @@ def check_compute_services(return_queue, retry=3):
     for i in range(retry):
         try:
             data = []
-            services = conn.compute.services()
+            services = cache.compute_services(conn)
             for s in services:
-                log.debug(f'{s.id} {s.binary} {s.state} {s.host}')
-                data.append({'id': s.id, 'name': s.binary, 'state': s.state, 'host': s.host})
+                log.debug(f"{s['id']} {s['binary']} {s['state']} {s['host']}")
+                data.append({'id': s['id'], 'name': s['binary'], 'state': s['state'], 'host': s['host']})
             break
         except Exception as e:
             log.error(f'fail to list nova services({i}): {e}')
@@ -73,19 +85,19 @@ def check_network_agents(return_queue, retry=3):
     for i in range(retry):
         try:
             data = []
-            agents = conn.network.agents()
+            agents = list_resources(conn.network, '/agents', 'agents', agent_fields)
             for a in agents:
-                log.debug((f'{a.id} {a.binary} {a.is_admin_state_up} {a.is_alive} '
-                           f'{a.host} {a.last_heartbeat_at} {a.started_at} {a.created_at}'))
+                log.debug((f"{a['id']} {a['binary']} {a['admin_state_up']} {a['alive']} "
+                           f"{a['host']} {a['heartbeat_timestamp']} {a['started_at']} {a['created_at']}"))
                 data.append({
-                    'id': a.id,
-                    'name': a.binary,
-                    'state': a.is_admin_state_up,
-                    'alive': a.is_alive,
-                    'host': a.host,
-                    'last_heartbeat_at': a.last_heartbeat_at,
-                    'started_at': a.started_at,
-                    'created_at': a.created_at
+                    'id': a['id'],
+                    'name': a['binary'],
+                    'state': a['admin_state_up'],
+                    'alive': a['alive'],
+                    'host': a['host'],
+                    'last_heartbeat_at': a['heartbeat_timestamp'],
+                    'started_at': a['started_at'],
+                    'created_at': a['created_at']
                 })
             break
         except Exception as e:
@@ -93,14 +105,35 @@ def check_network_agents(return_queue, retry=3):
     return_queue.put({'network_agents': data})
 
 
-def main(interval=3600, log_dir='./log'):
+# fields published as change event when changed, other fields change every check
+event_fields = {
+    'core_services': ['enabled'],
+    'compute_services': ['state'],
+    'hypervisors': ['status', 'state'],
+    'network_agents': ['state', 'alive'],
+}
+
+
+def main(interval=3600, log_dir='./log', event_dir=None, rules_file=None):
     region = conn._compute_region
     log.info(f'Start monitoring services, region={region}, interval={interval}')
 
+    events = EventBus(f'{event_dir}/service.sock' if event_dir else None)
+    events.start()
+    rules = load_rules(rules_file) if rules_file else RuleEngine()
+
     core_services_log_file = "services.core-services.log"
     compute_services_log_file = "services.compute-services.log"
     hypervisors_log_file = "services.hypervisors.log"
     network_agents_log_file = "services.network-agents.log"
+    alerts_log_file = "services.alerts.log"
+
+    # slow changing services, unchanged snapshot is written as reference line
+    dedup_log_files = [core_services_log_file, compute_services_log_file]
+    snapshots = SnapshotStore(log_dir)
+    journal = StateJournal(f'{region}.service', log_dir)
+    memory.install()
+    memory.register('events', events.snapshots)
 
     return_queue = queue.Queue()
     while True:
@@ -126,36 +159,54 @@ def main(interval=3600, log_dir='./log'):
             if 'core_services' in data:
                 log.debug(f"Core Services:\n{data['core_services']}")
                 target_log_file = core_services_log_file
-                target_data = data['core_services']
+                target_key = 'core_services'
             elif 'compute_services' in data:
                 log.debug(f"Compute Services:\n{data['compute_services']}")
                 target_log_file = compute_services_log_file
-                target_data =  data['compute_services']
+                target_key = 'compute_services'
             elif 'hypervisors' in data:
                 log.debug(f"Hypervisors:\n{data['hypervisors']}")
                 target_log_file = hypervisors_log_file
-                target_data =  data['hypervisors']
+                target_key = 'hypervisors'
             elif 'network_agents' in data:
                 log.debug(f"Network Agents:\n{data['network_agents']}")
                 target_log_file = network_agents_log_file
-                target_data =  data['network_agents']
+                target_key = 'network_agents'
+            target_data = data[target_key]
+            if len(target_data) != 0:  # empty data when listing failed
+                events.publish_changes(target_key, target_data, fields=event_fields[target_key], timestamp=check_time)
+                journal.record_all(target_key, target_data, check_time)
 
             Path(log_dir).mkdir(parents=True, exist_ok=True)
+            dedup = target_log_file in dedup_log_files
             target_log_file = f'{log_dir}/{region}.{target_log_file}'
-            with open(target_log_file, 'a') as f:
-                for item in target_data:
-                    l_data = []
-                    for key, value in item.items():
-                        l_data.append(f"{key}={value}")
-                    s_data = f','.join(l_data)
-                    f.write(f'{check_time} {s_data}\n')
+            if dedup:
+                snapshots.write(target_log_file, check_time, target_data)
+            else:
+                with open(target_log_file, 'a') as f:
+                    for item in target_data:
+                        l_data = []
+                        for key, value in item.items():
+                            l_data.append(f"{key}={value}")
+                        s_data = f','.join(l_data)
+                        f.write(f'{check_time} {s_data}\n')
+
+            alerts = rules.evaluate(target_key, target_data, timestamp=check_time)
+            if len(alerts) != 0:
+                with open(f'{log_dir}/{region}.{alerts_log_file}', 'a') as f:
+                    for a in alerts:
+                        log.warning(f"alert {a['rule']} {a['status']}: {a['entity']} {a['id']}")
+                        events.publish('alerts', f"{a['rule']}/{a['id']}", None, a, check_time)
+                        f.write(f"{check_time} rule={a['rule']},status={a['status']},entity={a['entity']},id={a['id']}\n")
 
         if threading.active_count() == 1:
             log.debug(f'Checking threads finished')
+        log.debug(f'Response cache {cache.cache.stats()}')
 
         time.sleep(interval)
 
 
 if __name__ == '__main__':
-    main()
+    main(event_dir=os.environ.get('MONITOR_EVENT_DIR'),
+         rules_file=os.environ.get('MONITOR_RULES_FILE'))
 
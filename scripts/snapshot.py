@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+import sys
+import json
+import hashlib
+from pathlib import Path
+
+
+def normalize(data):
+    ''' Return canonical json of snapshot, independent of item and key order '''
+    items = sorted(json.dumps(i, sort_keys=True, default=str) for i in data)
+    return f"[{','.join(items)}]"
+
+
+class SnapshotStore():
+    ''' Store identical snapshots once and write reference line when unchanged '''
+    def __init__(self, log_dir='./log'):
+        self.log_dir = log_dir
+        self.object_dir = Path(log_dir) / 'objects'
+        self.last_hash = {}
+
+    def object_path(self, digest):
+        return self.object_dir / digest[:2] / digest
+
+    def index_path(self, log_file):
+        return Path(f'{log_file}.index')
+
+    def last_digest(self, log_file):
+        if log_file not in self.last_hash:  # restore from index after restart
+            self.last_hash[log_file] = None
+            index = self.index_path(log_file)
+            if index.exists():
+                with open(index) as f:
+                    for line in f:
+                        self.last_hash[log_file] = line.split()[-1]
+        return self.last_hash[log_file]
+
+    def write(self, log_file, check_time, data):
+        ''' Write snapshot to log file, return True if written in full '''
+        payload = normalize(data)
+        digest = hashlib.sha256(payload.encode()).hexdigest()
+        path = self.object_path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(payload)
+        changed = digest != self.last_digest(log_file)
+        with open(log_file, 'a') as f:
+            if changed:
+                for item in data:
+                    l_data = []
+                    for key, value in item.items():
+                        l_data.append(f"{key}={value}")
+                    s_data = f','.join(l_data)
+                    f.write(f'{check_time} {s_data}\n')
+            else:
+                f.write(f'{check_time} @sha256={digest}\n')
+        with open(self.index_path(log_file), 'a') as f:
+            f.write(f'{check_time} {digest}\n')
+        self.last_hash[log_file] = digest
+        return changed
+
+    def read(self, log_file, check_time):
+        ''' Return snapshot written at or latest before check_time, None if not found '''
+        digest = None
+        index = self.index_path(log_file)
+        if not index.exists():
+            return None
+        with open(index) as f:
+            for line in f:
+                t, d = line.rsplit(' ', 1)
+                if t > check_time:
+                    break
+                digest = d.strip()
+        if digest == None:
+            return None
+        return json.loads(self.object_path(digest).read_text())
+
+
+if __name__ == '__main__':
+    # print snapshot of log file at given time
+    if len(sys.argv) != 3:
+        print(f'Arguments: <log file> <"YYYY-mm-dd HH:MM:SS">')
+        sys.exit(1)
+    log_file = Path(sys.argv[1])
+    data = SnapshotStore(log_file.parent).read(str(log_file), sys.argv[2])
+    if data == None:
+        print(f'no snapshot at {sys.argv[2]}')
+        sys.exit(1)
+    for item in data:
+        print(json.dumps(item))
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import time
+import socket
+import threading
+import openstack
+import logging as log
+from datetime import datetime
+from event import subscribe
+from checkpoint import reconstruct
+from projection import list_resources
+
+
+class TopologyIndex():
+    ''' Adjacency maps between hosts, instances, networks, routers and projects '''
+    def __init__(self):
+        self.instances = {}  # instance -> {'host', 'project', 'networks'}
+        self.routers = {}  # router -> {'project', 'networks'}
+        self.host_instances = {}
+        self.network_instances = {}  # network name -> instances
+        self.network_routers = {}  # network id -> routers
+        self.project_instances = {}
+        self.project_routers = {}
+        self.network_names = {}  # network id -> name
+        self.network_ids = {}  # network name -> ids
+        self.host_state = {}
+        self._lock = threading.RLock()
+
+    def _link(self, adjacency, key, value):
+        if key != None:
+            adjacency.setdefault(key, set()).add(value)
+
+    def _unlink(self, adjacency, key, value):
+        values = adjacency.get(key)
+        if values != None:
+            values.discard(value)
+            if len(values) == 0:
+                del(adjacency[key])
+
+    def update_instance(self, id, instance):
+        ''' Add, update or remove (instance None) instance links '''
+        with self._lock:
+            old = self.instances.pop(id, None)
+            if old != None:
+                self._unlink(self.host_instances, old['host'], id)
+                self._unlink(self.project_instances, old['project'], id)
+                for n in old['networks']:
+                    self._unlink(self.network_instances, n, id)
+            if instance == None:
+                return
+            new = {'host': instance.get('host'),
+                   'project': instance.get('project_id'),
+                   'networks': list(instance.get('network') or {})}
+            self.instances[id] = new
+            self._link(self.host_instances, new['host'], id)
+            self._link(self.project_instances, new['project'], id)
+            for n in new['networks']:
+                self._link(self.network_instances, n, id)
+
+    def update_router(self, id, router):
+        ''' Add, update or remove (router None) router links '''
+        with self._lock:
+            old = self.routers.pop(id, None)
+            if old != None:
+                self._unlink(self.project_routers, old['project'], id)
+                for n in old['networks']:
+                    self._unlink(self.network_routers, n, id)
+            if router == None:
+                return
+            networks = set(i['network_id'] for i in router.get('interfaces', []))
+            if router.get('external_gateway_info') != None:
+                networks.add(router['external_gateway_info']['network'])
+            new = {'project': router.get('project_id'), 'networks': list(networks)}
+            self.routers[id] = new
+            self._link(self.project_routers, new['project'], id)
+            for n in new['networks']:
+                self._link(self.network_routers, n, id)
+
+    def update_compute_service(self, service):
+        if service.get('name') == 'nova-compute':
+            with self._lock:
+                self.host_state[service['host']] = service['state']
+
+    def update_networks(self, networks):
+        ''' Update network id and name aliases, instances refer networks by name '''
+        with self._lock:
+            self.network_names = {}
+            self.network_ids = {}
+            for n in networks:
+                self.network_names[n['id']] = n['name']
+                self._link(self.network_ids, n['name'], n['id'])
+
+    def network_keys(self, network):
+        keys = {network}
+        if network in self.network_names:
+            keys.add(self.network_names[network])
+        keys.update(self.network_ids.get(network, ()))
+        return keys
+
+    def host(self, host):
+        ''' Instances, projects, networks and routers of those networks affected by host failure '''
+        with self._lock:
+            instances = sorted(self.host_instances.get(host, ()))
+            networks = set(n for i in instances for n in self.instances[i]['networks'])
+            routers = set()
+            for n in networks:  # instance networks by name, router networks by id
+                for k in self.network_keys(n):
+                    routers.update(self.network_routers.get(k, ()))
+            return {'host': host,
+                    'state': self.host_state.get(host),
+                    'instances': instances,
+                    'projects': sorted(set(self.instances[i]['project'] for i in instances) - {None}),
+                    'networks': sorted(networks),
+                    'routers': sorted(routers)}
+
+    def network(self, network):
+        ''' Instances, routers, hosts and projects affected by network failure, network by id or name '''
+        with self._lock:
+            instances, routers = set(), set()
+            for k in self.network_keys(network):
+                instances.update(self.network_instances.get(k, ()))
+                routers.update(self.network_routers.get(k, ()))
+            projects = set(self.instances[i]['project'] for i in instances)
+            projects.update(self.routers[r]['project'] for r in routers)
+            return {'network': network,
+                    'instances': sorted(instances),
+                    'routers': sorted(routers),
+                    'hosts': sorted(set(self.instances[i]['host'] for i in instances) - {None}),
+                    'projects': sorted(projects - {None})}
+
+    def project(self, project):
+        with self._lock:
+            return {'project': project,
+                    'instances': sorted(self.project_instances.get(project, ())),
+                    'routers': sorted(self.project_routers.get(project, ()))}
+
+    def instance(self, id):
+        with self._lock:
+            return dict(self.instances[id], instance=id) if id in self.instances else None
+
+    def router(self, id):
+        with self._lock:
+            return dict(self.routers[id], router=id) if id in self.routers else None
+
+    def query(self, request):
+        queries = {'host': self.host, 'network': self.network, 'project': self.project,
+                   'instance': self.instance, 'router': self.router}
+        if request.get('query') not in queries:
+            return {'error': f"unknown query {request.get('query')}, queries={list(queries)}"}
+        return queries[request['query']](request['id'])
+
+    def apply_state(self, state, replace=[]):
+        ''' Load collector state reconstructed from checkpoints, entities of replace topics absent from state are removed '''
+        with self._lock:
+            instances = state.get('instances', {})
+            routers = state.get('routers', {})
+            services = state.get('compute_services', {})
+            if 'instances' in replace:
+                for id in [id for id in self.instances if id not in instances]:
+                    self.update_instance(id, None)
+            if 'routers' in replace:
+                for id in [id for id in self.routers if id not in routers]:
+                    self.update_router(id, None)
+            if 'compute_services' in replace:
+                self.host_state = {}
+            for id, instance in instances.items():
+                self.update_instance(id, instance)
+            for id, router in routers.items():
+                self.update_router(id, router)
+            for service in services.values():
+                self.update_compute_service(service)
+
+    def apply_event(self, event):
+        if event['topic'] == 'instances':
+            self.update_instance(event['id'], event['new'])
+        elif event['topic'] == 'routers':
+            self.update_router(event['id'], event['new'])
+        elif event['topic'] == 'compute_services' and event['new'] != None:
+            self.update_compute_service(event['new'])
+
+
+def follow_events(index, path, topics, collector, log_dir='./log', retry_wait=10):
+    ''' Apply events of collector socket to index, reconnect when disconnected '''
+    # events published while disconnected are lost, reload collector state on each connect
+    def resync():
+        try:
+            state = reconstruct(collector, int(time.time()), log_dir)
+            if state != None:
+                index.apply_state(state, replace=topics)
+                log.info(f'topology reloaded {collector} state')
+        except Exception as e:
+            log.error(f'fail to reload {collector} state: {e}')
+
+    while True:
+        try:
+            for event in subscribe(path, topics, on_connect=resync):
+                index.apply_event(event)
+        except OSError as e:
+            log.warning(f'event socket {path} disconnected: {e}')
+        time.sleep(retry_wait)
+
+
+def answer(index, sock):
+    ''' Answer one json query per line until client closes connection '''
+    try:
+        with sock, sock.makefile('rw') as f:
+            for line in f:
+                try:
+                    result = index.query(json.loads(line))
+                except Exception as e:
+                    result = {'error': str(e)}
+                f.write(f'{json.dumps(result)}\n')
+                f.flush()
+    except OSError as e:
+        log.info(f'topology query client disconnected: {e}')
+
+
+def serve(index, path):
+    ''' Answer queries on unix socket, each connection in own thread '''
+    if os.path.exists(path):
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen()
+    log.info(f'topology query listen on {path}')
+    while True:
+        sock, _ = server.accept()
+        threading.Thread(target=answer, args=(index, sock), daemon=True).start()
+
+
+def main(event_dir, log_dir='./log', network_interval=600):
+    conn = openstack.connect()
+    region = conn._compute_region
+    index = TopologyIndex()
+
+    # start from checkpointed collector state, then follow collector events
+    now = int(datetime.now().timestamp())
+    for collector in ['instance', 'router', 'service']:
+        state = reconstruct(f'{region}.{collector}', now, log_dir)
+        if state != None:
+            index.apply_state(state)
+    for collector, topics in [('instance', ['instances']), ('router', ['routers']),
+                              ('service', ['compute_services'])]:
+        t = threading.Thread(target=follow_events, args=(index, f'{event_dir}/{collector}.sock', topics,
+                                                         f'{region}.{collector}', log_dir), daemon=True)
+        t.start()
+    t = threading.Thread(target=serve, args=(index, f'{event_dir}/topology.sock'), daemon=True)
+    t.start()
+
+    while True:
+        try:
+            index.update_networks(list_resources(conn.network, '/networks', 'networks', ['id', 'name']))
+        except Exception as e:
+            log.error(f'fail to list networks: {e}')
+        time.sleep(network_interval)
+
+
+if __name__ == '__main__':
+    log.basicConfig(format="%(asctime)s: %(message)s", level=log.INFO, datefmt="%Y-%m-%d %H:%M:%S")
+    main(os.environ.get('MONITOR_EVENT_DIR', '.'))